@@ -1,22 +1,74 @@
 import asyncio
+import os
 import re
+import time
+from collections import OrderedDict
 
 import httpx
 
-from .strategy import Audio, Live, Opus, Read, Video
-from .utils import ParserException, headers, logger, retry_catcher
+from .strategy import Audio, Feed, Live, Opus, Read, Video
+from .utils import ParserException, headers, limits, logger, retry_catcher
+
+FEED_CACHE_TTL = 60
+FEED_CACHE_SIZE = 512
+PARSER_SEMAPHORE_SIZE = int(os.environ.get("PARSER_SEMAPHORE_SIZE", 8))
+
+VIDEO_ID_REGEX = re.compile(r"BV\w{10}|av\d+|ep\d+|ss\d+")
+VIDEO_URL_REGEX = re.compile(r"video|bangumi/play|festival")
+IGNORED_URL_REGEX = re.compile(
+    r"^https?:\/\/(?:api|www\.bilibili\.com\/blackboard|space\.bilibili\.com)"
+)
+OPUS_URL_REGEX = re.compile(r"^https?:\/\/[th]\.|dynamic|opus")
+# pages that never redirect to another content type, no need to resolve them
+CANONICAL_URL_REGEX = re.compile(
+    r"^https?:\/\/(?:(?:(?:www|m)\.)?bilibili\.com\/(?:video|bangumi\/play|read|audio)\/|live\.bilibili\.com\/\d+)"
+)
+
+__feed_cache: OrderedDict[str, tuple[float, Feed]] = OrderedDict()
+__api_client: httpx.AsyncClient | None = None
+__parser_semaphore: asyncio.Semaphore | None = None
+
+
+def client_init() -> None:
+    # bound to the running loop, create from the application lifecycle
+    global __api_client, __parser_semaphore
+    __api_client = httpx.AsyncClient(
+        headers=headers,
+        limits=limits,
+        http2=True,
+        timeout=90,
+        follow_redirects=True,
+    )
+    __parser_semaphore = asyncio.Semaphore(PARSER_SEMAPHORE_SIZE)
+
+
+async def client_close() -> None:
+    global __api_client, __parser_semaphore
+    if __api_client is not None:
+        await __api_client.aclose()
+    __api_client = None
+    __parser_semaphore = None
 
 
 @retry_catcher
 async def __feed_parser(client: httpx.AsyncClient, url: str):
     # bypass b23 short link
-    if re.search(r"BV\w{10}|av\d+|ep\d+|ss\d+", url):
+    if VIDEO_ID_REGEX.search(url):
         return await Video(url if "/" in url else f"b23.tv/{url}", client).handle()
-    r = await client.get(url)
-    url = str(r.url)
-    logger.debug(f"URL: {url}")
+    if not CANONICAL_URL_REGEX.search(url):
+        # only the final url is needed, skip the page body when the host allows it
+        try:
+            r = await client.head(url)
+        except httpx.HTTPError as err:
+            # some hosts reset HEAD connections, a plain GET still resolves them
+            logger.debug("HEAD {} 失败: {}", url, err)
+            r = None
+        if r is None or r.is_error:
+            r = await client.get(url)
+        url = str(r.url)
+        logger.debug("URL: {}", url)
     # main video
-    if re.search(r"video|bangumi/play|festival", url):
+    if VIDEO_URL_REGEX.search(url):
         return await Video(url, client).handle()
     # au audio
     elif "read" in url:
@@ -28,50 +80,69 @@ async def __feed_parser(client: httpx.AsyncClient, url: str):
     elif "live" in url:
         return await Live(url, client).handle()
     # API link blackboard link user space link
-    elif re.search(
-        r"^https?:\/\/(?:api|www\.bilibili\.com\/blackboard|space\.bilibili\.com)", url
-    ):
+    elif IGNORED_URL_REGEX.search(url):
         pass
     # dynamic opus
-    elif re.search(r"^https?:\/\/[th]\.|dynamic|opus", url):
+    elif OPUS_URL_REGEX.search(url):
         return await Opus(url, client).handle()
     raise ParserException("URL错误", url)
 
 
-async def biliparser(urls) -> list[Video | Read | Audio | Live | Opus]:
+async def __cached_feed_parser(client: httpx.AsyncClient, url: str, refresh: bool):
+    cache = None if refresh else __feed_cache.get(url)
+    if cache and time.monotonic() - cache[0] < FEED_CACHE_TTL:
+        logger.info(f"拉取解析缓存: {url}")
+        __feed_cache.move_to_end(url)
+        return cache[1]
+    async with __parser_semaphore:
+        result = await __feed_parser(client, url)
+    if isinstance(result, Feed):
+        __feed_cache[url] = (time.monotonic(), result)
+        __feed_cache.move_to_end(url)
+        while len(__feed_cache) > FEED_CACHE_SIZE:
+            __feed_cache.popitem(last=False)
+    return result
+
+
+async def biliparser(
+    urls, refresh: bool = False
+) -> list[Video | Read | Audio | Live | Opus]:
     if isinstance(urls, str):
         urls = [urls]
     elif isinstance(urls, tuple):
         urls = list(urls)
-    async with httpx.AsyncClient(
-        headers=headers, http2=True, timeout=90, follow_redirects=True
-    ) as client:
-        tasks = list(
-            __feed_parser(
-                client,
-                f"http://{url}"
-                if not url.startswith(("http:", "https:", "av", "BV"))
-                else url,
-            )
-            for url in list(set(urls))
+    if __api_client is None:
+        client_init()
+    client = __api_client
+    tasks = list(
+        __cached_feed_parser(
+            client,
+            f"http://{url}"
+            if not url.startswith(("http:", "https:", "av", "BV"))
+            else url,
+            refresh,
         )
-        callbacks = await asyncio.gather(*tasks)
+        for url in dict.fromkeys(urls)
+    )
+    callbacks = await asyncio.gather(*tasks)
     for num, f in enumerate(callbacks):
         if isinstance(f, Exception):
             logger.warning(f"排序: {num}\n异常: {f}\n")
         else:
             logger.debug(
-                f"排序: {num}\n"
-                f"类型: {type(f)}\n"
-                f"链接: {f.url}\n"
-                f"用户: {f.user_markdown}\n"
-                f"内容: {f.content_markdown}\n"
-                f"附加内容: {f.extra_markdown}\n"
-                f"评论: {f.comment_markdown}\n"
-                f"媒体: {f.mediaurls}\n"
-                f"媒体种类: {f.mediatype}\n"
-                f"媒体预览: {f.mediathumb}\n"
-                f"媒体标题: {f.mediatitle}\n"
-                f"媒体文件名: {f.mediafilename}"
+                "排序: {num}\n"
+                "类型: {f.__class__}\n"
+                "链接: {f.url}\n"
+                "用户: {f.user_markdown}\n"
+                "内容: {f.content_markdown}\n"
+                "附加内容: {f.extra_markdown}\n"
+                "评论: {f.comment_markdown}\n"
+                "媒体: {f.mediaurls}\n"
+                "媒体种类: {f.mediatype}\n"
+                "媒体预览: {f.mediathumb}\n"
+                "媒体标题: {f.mediatitle}\n"
+                "媒体文件名: {f.mediafilename}",
+                num=num,
+                f=f,
             )
     return callbacks
@@ -1,10 +1,15 @@
 import asyncio
+import hashlib
 import os
 import re
 import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from io import BytesIO
 from pathlib import Path
-from uuid import uuid4
+from secrets import token_hex
 
 import httpx
 import pytz
@@ -25,6 +30,7 @@ from telegram import (
     InputMediaPhoto,
     InputMediaVideo,
     InputTextMessageContent,
+    Message,
     MessageEntity,
     MessageOriginChannel,
     MessageOriginChat,
@@ -33,7 +39,7 @@ from telegram import (
     Update,
 )
 from telegram.constants import ChatAction, ParseMode
-from telegram.error import BadRequest, NetworkError, RetryAfter
+from telegram.error import BadRequest, NetworkError, RetryAfter, TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -43,20 +49,52 @@ from telegram.ext import (
     MessageHandler,
     filters,
 )
+from tortoise.exceptions import IntegrityError
+from tortoise.transactions import in_transaction
 
-from . import biliparser
+from . import biliparser, client_close, client_init
 from .database import db_close, db_init, file_cache
+from .strategy import Feed
 from .utils import (
     LOCAL_MODE,
     compress,
     escape_markdown,
     headers,
+    is_gif,
+    limits,
     logger,
     referer_url,
 )
 
-BILIBILI_URL_REGEX = r"(?i)(?:https?://)?[\w\.]*?(?:bilibili(?:bb)?\.com|(?:b23(?:bb)?|acg)\.tv|bili2?2?3?3?\.cn)\S+|BV\w{10}"
-BILIBILI_SHARE_URL_REGEX = r"(?i)【.*】 https://[\w\.]*?(?:bilibili\.com|b23\.tv|bili2?2?3?3?\.cn)\S+"
+BILIBILI_URL_REGEX = re.compile(
+    r"(?:https?://)?[\w\.]*?(?:b(?:ili(?:bili(?:bb)?\.com|2?2?3?3?\.cn)|23(?:bb)?\.tv)|acg\.tv)\S+|BV\w{10}",
+    re.IGNORECASE,
+)
+BILIBILI_SHARE_URL_REGEX = re.compile(
+    r"【.*】 https://[\w\.]*?(?:b(?:ili(?:bili\.com|2?2?3?3?\.cn)|23\.tv))\S+",
+    re.IGNORECASE,
+)
+# cheap substring pre-check, every BILIBILI_URL_REGEX match contains one of these
+BILIBILI_URL_KEYWORDS = ("bili", "b23", "acg.tv", "bv")
+# telegram reports the failing album item as "Failed to send message #N ..."
+MEDIA_GROUP_ERROR_REGEX = re.compile(r"message #(\d+)")
+MEDIA_EXPIRED_ERROR_REGEX = re.compile(r"媒体文件获取错误: (?:403|412) ")
+
+MEDIA_SEMAPHORE_SIZE = int(os.environ.get("MEDIA_SEMAPHORE_SIZE", 8))
+# created in post_init, both are bound to the application's event loop
+MEDIA_CLIENT: httpx.AsyncClient
+MEDIA_SEMAPHORE: asyncio.Semaphore
+MEDIA_CACHE_PATH = Path(
+    os.environ.get("MEDIA_CACHE_PATH", Path(tempfile.gettempdir()) / "bilifeedbot")
+)
+MEDIA_CACHE_SIZE = int(os.environ.get("MEDIA_CACHE_SIZE", 500 * 1024 * 1024))
+# bytes on disk, counted once on the first write and kept up to date after that
+MEDIA_CACHE_USED: int | None = None
+MEDIA_CACHE_LOCK = threading.Lock()
+MEDIA_CHUNK_SIZE = 1024 * 1024
+LOCAL_TEMP_FILE_PATH = Path(os.environ.get("LOCAL_TEMP_FILE_PATH", ".tmp"))
+FILE_ID_CACHE_SIZE = 4096
+FILE_ID_CACHE: OrderedDict[str, str] = OrderedDict()
 
 SOURCE_CODE_MARKUP = InlineKeyboardMarkup(
     [
@@ -70,6 +108,11 @@ SOURCE_CODE_MARKUP = InlineKeyboardMarkup(
 )
 
 
+INLINE_HELP_TITLE = "帮助"
+INLINE_HELP_DESCRIPTION = "将 Bot 添加到群组或频道可以自动匹配消息, 请注意 Inline 模式存在限制: 只可发单张图，消耗设备流量。"
+
+
+@lru_cache(maxsize=1024)
 def origin_link(content: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         [
@@ -80,17 +123,132 @@ def origin_link(content: str) -> InlineKeyboardMarkup:
     )
 
 
-async def get_description(context: ContextTypes.DEFAULT_TYPE):
-    bot_me = await context.bot.get_me()
-    return f"欢迎使用 @{bot_me.username} 的 Inline 模式来转发动态，您也可以将 Bot 添加到群组或频道自动匹配消息。\nInline 模式限制: 只可发单张图，消耗设备流量，安全性低\n群组模式限制: 图片小于10M，视频小于50M，通过 Bot 上传速度较慢"
+@lru_cache(maxsize=1)
+def inline_help(description: str) -> tuple[InlineQueryResultArticle]:
+    return (
+        InlineQueryResultArticle(
+            id="help",
+            title=INLINE_HELP_TITLE,
+            description=INLINE_HELP_DESCRIPTION,
+            reply_markup=SOURCE_CODE_MARKUP,
+            input_message_content=InputTextMessageContent(description),
+        ),
+    )
+
+
+def get_description(context: ContextTypes.DEFAULT_TYPE):
+    # bot.username is filled by Application.initialize(), no get_me() round-trip
+    return f"欢迎使用 @{context.bot.username} 的 Inline 模式来转发动态，您也可以将 Bot 添加到群组或频道自动匹配消息。\nInline 模式限制: 只可发单张图，消耗设备流量，安全性低\n群组模式限制: 图片小于10M，视频小于50M，通过 Bot 上传速度较慢"
+
+
+def remember_file_id(filename: str, file_id: str):
+    FILE_ID_CACHE[filename] = file_id
+    FILE_ID_CACHE.move_to_end(filename)
+    while len(FILE_ID_CACHE) > FILE_ID_CACHE_SIZE:
+        FILE_ID_CACHE.popitem(last=False)
 
 
 async def get_cache_media(filename):
+    file_id = FILE_ID_CACHE.get(filename)
+    if file_id:
+        FILE_ID_CACHE.move_to_end(filename)
+        return file_id
     file = await file_cache.get_or_none(mediafilename=filename)
     if file:
+        remember_file_id(filename, file.file_id)
         return file.file_id
 
 
+async def get_cache_media_many(filenames: list[str]) -> dict[str, str]:
+    result = {
+        filename: FILE_ID_CACHE[filename]
+        for filename in filenames
+        if filename in FILE_ID_CACHE
+    }
+    missing = [filename for filename in filenames if filename not in result]
+    if missing:
+        # one IN (...) query for the rest of the album
+        for filename, file_id in await file_cache.filter(
+            mediafilename__in=missing
+        ).values_list("mediafilename", "file_id"):
+            remember_file_id(filename, file_id)
+            result[filename] = file_id
+    return result
+
+
+def media_cache_file(url: str, size: int) -> Path:
+    key = hashlib.blake2b(f"{url}|{size}".encode(), digest_size=16).hexdigest()
+    return MEDIA_CACHE_PATH / key
+
+
+def prune_media_cache() -> int:
+    files = [
+        (item.stat(), item) for item in MEDIA_CACHE_PATH.iterdir() if item.is_file()
+    ]
+    total = sum(stat.st_size for stat, _ in files)
+    # trim below the limit so the next writes do not rescan right away
+    target = MEDIA_CACHE_SIZE * 9 // 10
+    for stat, item in sorted(files, key=lambda x: x[0].st_mtime):
+        if total <= target:
+            break
+        item.unlink(missing_ok=True)
+        total -= stat.st_size
+    return total
+
+
+def store_media_cache(cached: Path, img) -> None:
+    global MEDIA_CACHE_USED
+    MEDIA_CACHE_PATH.mkdir(parents=True, exist_ok=True)
+    partial = cached.with_suffix(f".{token_hex(8)}")
+    try:
+        partial.write_bytes(img)
+        with MEDIA_CACHE_LOCK:
+            try:
+                replaced = cached.stat().st_size
+            except FileNotFoundError:
+                replaced = 0
+            partial.replace(cached)
+            if MEDIA_CACHE_USED is None:
+                # first write since startup, count what is already on disk
+                MEDIA_CACHE_USED = prune_media_cache()
+            else:
+                MEDIA_CACHE_USED += len(img) - replaced
+                if MEDIA_CACHE_USED > MEDIA_CACHE_SIZE:
+                    MEDIA_CACHE_USED = prune_media_cache()
+    except BaseException:
+        # no-op once renamed, otherwise do not leave the partial write behind
+        partial.unlink(missing_ok=True)
+        raise
+
+
+def read_media_cache(cached: Path) -> bytes | None:
+    try:
+        content = cached.read_bytes()
+    except FileNotFoundError:
+        return None
+    try:
+        # bump mtime for the prune order, touch() would recreate a pruned file
+        os.utime(cached)
+    except FileNotFoundError:
+        pass
+    return content
+
+
+async def save_response(response: httpx.Response, media: Path) -> None:
+    file = await asyncio.to_thread(open, media, "wb")
+    try:
+        async for chunk in response.aiter_bytes(MEDIA_CHUNK_SIZE):
+            # a 1 MiB write would stall every other update on the loop
+            await asyncio.to_thread(file.write, chunk)
+    except BaseException:
+        # failed or cancelled by a sibling download, drop the partial file
+        file.close()
+        media.unlink(missing_ok=True)
+        raise
+    else:
+        await asyncio.to_thread(file.close)
+
+
 async def get_media(
     client: httpx.AsyncClient,
     referer,
@@ -99,13 +257,22 @@ async def get_media(
     compression: bool = True,
     size: int = 320,
     media_check_ignore: bool = False,
-) -> Path | str:
+) -> Path | str | bytes | BytesIO:
     file_id: str | None = await get_cache_media(filename)
     if file_id:
         return file_id
-    header = headers.copy()
-    header["Referer"] = referer
-    async with client.stream("GET", url, headers=header) as response:
+    media = LOCAL_TEMP_FILE_PATH / filename
+    cached = media_cache_file(url, size) if compression else None
+    if cached:
+        content = await asyncio.to_thread(read_media_cache, cached)
+        if content is not None:
+            logger.info(f"命中缓存: {url}")
+            # compressed images are small, hand them to telegram from memory
+            return content
+    async with (
+        MEDIA_SEMAPHORE,
+        client.stream("GET", url, headers={"Referer": referer}) as response,
+    ):
         logger.info(f"下载开始: {url}")
         if response.status_code != 200:
             raise NetworkError(
@@ -115,26 +282,54 @@ async def get_media(
         if content_type is None:
             raise NetworkError(f"媒体文件获取错误: 无法获取 content-type {url}->{referer}")
         mediatype = content_type.split("/")
-        filepath = Path(os.environ.get("LOCAL_TEMP_FILE_PATH", ".tmp"))
-        filepath.mkdir(parents=True, exist_ok=True)
-        media = filepath / filename
         if mediatype[0] in ["video", "audio", "application"]:
-            with open(media, "wb") as file:
-                async for chunk in response.aiter_bytes():
-                    file.write(chunk)
+            await save_response(response, media)
         elif media_check_ignore or mediatype[0] == "image":
-            img = await response.aread()
             if compression and mediatype[1] in ["jpeg", "png"]:
                 logger.info(f"压缩: {url} {mediatype[1]}")
-                img = compress(BytesIO(img), size).getvalue()
-            with open(media, "wb") as file:
-                file.write(img)
+                img = await asyncio.to_thread(
+                    compress, BytesIO(await response.aread()), size
+                )
+                if cached:
+                    try:
+                        # disk writes and the occasional prune stay off the loop
+                        await asyncio.to_thread(
+                            store_media_cache, cached, img.getbuffer()
+                        )
+                    except OSError as e:
+                        logger.exception(f"缓存媒体文件错误: {e}")
+                logger.info(f"完成下载: {url}")
+                img.seek(0)
+                return img
+            else:
+                await save_response(response, media)
         else:
             raise NetworkError(f"媒体文件类型错误: {mediatype} {url}->{referer}")
         logger.info(f"完成下载: {media}")
         return media
 
 
+async def get_medias(*coros) -> list[Path | str | bytes | BytesIO]:
+    tasks: list[asyncio.Task] = []
+    try:
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(coro) for coro in coros]
+    except BaseException as err:
+        # the caller never sees the list, remove what finished before the failure
+        for task in tasks:
+            if (
+                task.done()
+                and not task.cancelled()
+                and task.exception() is None
+                and isinstance(task.result(), Path)
+            ):
+                task.result().unlink(missing_ok=True)
+        if isinstance(err, ExceptionGroup):
+            raise err.exceptions[0]
+        raise
+    return [task.result() for task in tasks]
+
+
 async def cache_media(
     mediafilename: str,
     file,
@@ -142,44 +337,227 @@ async def cache_media(
     if not file:
         return
     try:
-        return await file_cache.update_or_create(
+        result = await file_cache.update_or_create(
             mediafilename=mediafilename, defaults=dict(file_id=file.file_id)
         )
     except Exception as e:
         logger.exception(e)
         return
+    # only serve file_ids the database actually holds
+    remember_file_id(mediafilename, file.file_id)
+    return result
 
 
-def message_to_urls(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    message = update.message or update.channel_post
-    if (
-        message is None
-        or (
-            type(message.forward_origin) == MessageOriginUser
-            and (
-                message.forward_origin.sender_user.is_bot
-                and message.forward_origin.sender_user.username == context.bot.username
-            )
-        )
-        or (
-            type(message.forward_origin) == MessageOriginHiddenUser
-            and message.forward_origin.sender_user_name == context.bot.first_name
+async def cache_media_group(mediafilenames: list[str], messages: tuple[Message, ...]):
+    files = [
+        file_cache(
+            mediafilename=mediafilename,
+            file_id=(
+                message.effective_attachment[0]  # PhotoSize
+                if isinstance(message.effective_attachment, tuple)
+                else message.effective_attachment
+            ).file_id,
         )
-        or (
-            (
-                type(message.forward_origin) == MessageOriginChat
-                or type(message.forward_origin) == MessageOriginChannel
+        for mediafilename, message in zip(mediafilenames, messages)
+        if message.effective_attachment
+    ]
+    if not files:
+        return
+    try:
+        # one transaction for the whole album instead of a commit per item
+        async with in_transaction():
+            for file in files:
+                await file_cache.update_or_create(
+                    mediafilename=file.mediafilename,
+                    defaults=dict(file_id=file.file_id),
+                )
+    except IntegrityError:
+        # a file_id stored under another name aborts the batch, upsert one by one
+        for file in files:
+            await cache_media(file.mediafilename, file)
+    except Exception as e:
+        logger.exception(e)
+        return
+    else:
+        for file in files:
+            remember_file_id(file.mediafilename, file.file_id)
+
+
+async def download_feed_media(
+    f: Feed,
+) -> tuple[
+    list[Path | str | bytes | BytesIO], Path | str | bytes | BytesIO | None
+]:
+    downloads = [
+        get_media(MEDIA_CLIENT, f.url, media, filename, size=1280)
+        for media, filename in zip(f.mediaurls, f.mediafilename)
+    ]
+    if f.mediathumb:
+        # fetch the thumbnail alongside the media, not before it
+        downloads.append(
+            get_media(
+                MEDIA_CLIENT, f.url, f.mediathumb, f.mediathumbfilename, size=320
             )
-            and message.forward_origin.author_signature == context.bot.first_name
         )
-    ):
+    logger.info(f"下载中: {f.url}")
+    media = await get_medias(*downloads)
+    mediathumb = media.pop() if f.mediathumb else None
+    logger.info(f"下载完成: {f.url}")
+    return media, mediathumb
+
+
+def discard_feed_media(task: asyncio.Task) -> None:
+    # prefetched downloads that were never sent
+    if task.cancelled() or task.exception():
+        # get_medias already removed whatever the failed download wrote
+        return
+    media, mediathumb = task.result()
+    for item in [mediathumb, *media]:
+        if isinstance(item, Path):
+            item.unlink(missing_ok=True)
+
+
+def has_bilibili_keyword(text: str) -> bool:
+    text = text.lower()
+    return any(keyword in text for keyword in BILIBILI_URL_KEYWORDS)
+
+
+def is_forwarded_from_self(message: Message, context: ContextTypes.DEFAULT_TYPE):
+    origin = message.forward_origin
+    if isinstance(origin, MessageOriginUser):
+        return (
+            origin.sender_user.is_bot
+            and origin.sender_user.username == context.bot.username
+        )
+    if isinstance(origin, MessageOriginHiddenUser):
+        return origin.sender_user_name == context.bot.first_name
+    if isinstance(origin, (MessageOriginChat, MessageOriginChannel)):
+        return origin.author_signature == context.bot.first_name
+    return False
+
+
+def message_to_urls(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # effective_message would also pick up callback query and business messages
+    message = update.message or update.channel_post
+    if message is None or is_forwarded_from_self(message, context):
         return message, []
-    urls = re.findall(BILIBILI_URL_REGEX, message.text or message.caption or "")
+    text = message.text or message.caption or ""
+    urls = BILIBILI_URL_REGEX.findall(text) if has_bilibili_keyword(text) else []
     if message.entities:
         for entity in message.entities:
-            if entity.url:
-                urls.extend(re.findall(BILIBILI_URL_REGEX, entity.url))
-    return message, urls
+            if entity.url and has_bilibili_keyword(entity.url):
+                urls.extend(BILIBILI_URL_REGEX.findall(entity.url))
+    return message, list(dict.fromkeys(urls))
+
+
+async def reply_video(
+    message: Message,
+    f: Feed,
+    media: list,
+    mediathumb,
+    caption: str,
+    reply_markup: InlineKeyboardMarkup,
+) -> Message:
+    width, height = f.mediasize
+    return await message.reply_video(
+        media[0],
+        caption=caption,
+        reply_markup=reply_markup,
+        supports_streaming=True,
+        thumbnail=mediathumb,
+        duration=f.mediaduration,
+        write_timeout=60,
+        filename=f.mediafilename[0],
+        width=width,
+        height=height,
+    )
+
+
+async def reply_audio(
+    message: Message,
+    f: Feed,
+    media: list,
+    mediathumb,
+    caption: str,
+    reply_markup: InlineKeyboardMarkup,
+) -> Message:
+    return await message.reply_audio(
+        media[0],
+        caption=caption,
+        duration=f.mediaduration,
+        performer=f.user,
+        reply_markup=reply_markup,
+        thumbnail=mediathumb,
+        title=f.mediatitle,
+        write_timeout=60,
+        filename=f.mediafilename[0],
+    )
+
+
+async def reply_image(
+    message: Message,
+    f: Feed,
+    media: list,
+    mediathumb,
+    caption: str,
+    reply_markup: InlineKeyboardMarkup,
+) -> Message | tuple[Message, ...]:
+    if len(f.mediaurls) == 1:
+        if is_gif(f.mediaurls[0]):
+            return await message.reply_animation(
+                media[0],
+                caption=caption,
+                reply_markup=reply_markup,
+                write_timeout=60,
+                filename=f.mediafilename[0],
+            )
+        return await message.reply_photo(
+            media[0],
+            caption=caption,
+            reply_markup=reply_markup,
+            write_timeout=60,
+            filename=f.mediafilename[0],
+        )
+    # album caption is shown from the first item only
+    result = await message.reply_media_group(
+        [
+            (
+                InputMediaVideo(
+                    img,
+                    caption=caption if not num else None,
+                    filename=filename,
+                    supports_streaming=True,
+                )
+                if is_gif(mediaurl)
+                else InputMediaPhoto(
+                    img,
+                    caption=caption if not num else None,
+                    filename=filename,
+                )
+            )
+            for num, (img, mediaurl, filename) in enumerate(
+                zip(media, f.mediaurls, f.mediafilename)
+            )
+        ],
+        write_timeout=60,
+    )
+    # albums cannot carry buttons, follow up with the origin link only
+    try:
+        await message.reply_text(escape_markdown(f.url), reply_markup=reply_markup)
+    except TelegramError as err:
+        # the album is already out, do not let the retry loop send it again
+        logger.error(f"{err} -> 原链接发送失败: {f.url}")
+    return result
+
+
+MEDIA_REPLIES = {"video": reply_video, "audio": reply_audio}
+
+
+async def send_typing(message: Message) -> None:
+    try:
+        await asyncio.wait_for(message.reply_chat_action(ChatAction.TYPING), 2)
+    except (TimeoutError, TelegramError) as err:
+        logger.debug(f"发送输入状态失败: {err}")
 
 
 async def parse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -187,48 +565,46 @@ async def parse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if message is None or not urls:
         return
     logger.info(f"Parse: {urls}")
+    # let the typing hint go out while the links are being parsed
+    context.application.create_task(send_typing(message), update=update)
+    feeds = await biliparser(urls)
+    prefetched: dict[int, asyncio.Task] = {}
     try:
-        await message.reply_chat_action(ChatAction.TYPING)
-    except:
-        pass
-    for f in await biliparser(urls):
-        for i in range(1, 5):
-            if isinstance(f, Exception):
-                logger.warning(f"解析错误! {f}")
-                if message.text and message.text.startswith("/parse"):
-                    await message.reply_text(str(f))
-                break
-            try:
-                if not f.mediaurls:
-                    await message.reply_text(f.caption, reply_markup=origin_link(f.url))
-                else:
-                    medias = []
-                    mediathumb = None
-                    try:
-                        async with httpx.AsyncClient(
-                            http2=True, timeout=90, follow_redirects=True
-                        ) as client:
-                            if f.mediaraws or LOCAL_MODE:
-                                mediathumb = (
-                                    await get_media(
-                                        client,
-                                        f.url,
-                                        f.mediathumb,
-                                        f.mediathumbfilename,
-                                        size=320,
-                                    )
-                                    if f.mediathumb
-                                    else None
+        for index, f in enumerate(feeds):
+            # download the next feed while this one is uploading
+            if (
+                index + 1 < len(feeds)
+                and isinstance(feeds[index + 1], Feed)
+                and feeds[index + 1].mediaurls
+                and (feeds[index + 1].mediaraws or LOCAL_MODE)
+            ):
+                prefetched[index + 1] = asyncio.create_task(
+                    download_feed_media(feeds[index + 1])
+                )
+            failed_media: list[int] = []
+            # feeds are shared through the parser cache, keep retry state local
+            mediaraws = False
+            for i in range(1, 5):
+                reparse = False
+                if isinstance(f, Exception):
+                    logger.warning(f"解析错误! {f}")
+                    if message.text and message.text.startswith("/parse"):
+                        await message.reply_text(str(f))
+                    break
+                try:
+                    caption = f.caption
+                    reply_markup = origin_link(f.url)
+                    if not f.mediaurls:
+                        await message.reply_text(caption, reply_markup=reply_markup)
+                    else:
+                        medias = []
+                        mediathumb = None
+                        try:
+                            if f.mediaraws or mediaraws or LOCAL_MODE:
+                                task = prefetched.pop(index, None)
+                                media, mediathumb = await (
+                                    task if task else download_feed_media(f)
                                 )
-                                tasks = [
-                                    get_media(client, f.url, media, filename, size=1280)
-                                    for media, filename in zip(
-                                        f.mediaurls, f.mediafilename
-                                    )
-                                ]
-                                logger.info(f"下载中: {f.url}")
-                                media = await asyncio.gather(*tasks)
-                                logger.info(f"下载完成: {f.url}")
                             else:
                                 mediathumb = (
                                     referer_url(f.mediathumb, f.url)
@@ -237,102 +613,36 @@ async def parse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                 )
                                 if f.mediatype == "image":
                                     media = [
-                                        i if ".gif" in i else i + "@1280w.jpg"
+                                        i if is_gif(i) else f"{i}@1280w.jpg"
                                         for i in f.mediaurls
                                     ]
+                                    if failed_media:
+                                        # only proxy the album items telegram failed to fetch
+                                        downloaded = await get_medias(
+                                            *(
+                                                get_media(
+                                                    MEDIA_CLIENT,
+                                                    f.url,
+                                                    f.mediaurls[num],
+                                                    f.mediafilename[num],
+                                                    size=1280,
+                                                )
+                                                for num in failed_media
+                                            )
+                                        )
+                                        for num, item in zip(failed_media, downloaded):
+                                            media[num] = item
                                 elif f.mediatype in ["video", "audio"]:
                                     media = [referer_url(f.mediaurls[0], f.url)]
                                 else:
                                     media = f.mediaurls
-                            if f.mediatype == "video":
-                                result = await message.reply_video(
-                                    media[0],
-                                    caption=f.caption,
-                                    reply_markup=origin_link(f.url),
-                                    supports_streaming=True,
-                                    thumbnail=mediathumb,
-                                    duration=f.mediaduration,
-                                    write_timeout=60,
-                                    filename=f.mediafilename[0],
-                                    width=(
-                                        f.mediadimention["height"]
-                                        if f.mediadimention["rotate"]
-                                        else f.mediadimention["width"]
-                                    ),
-                                    height=(
-                                        f.mediadimention["width"]
-                                        if f.mediadimention["rotate"]
-                                        else f.mediadimention["height"]
-                                    ),
-                                )
-                            elif f.mediatype == "audio":
-                                result = await message.reply_audio(
-                                    media[0],
-                                    caption=f.caption,
-                                    duration=f.mediaduration,
-                                    performer=f.user,
-                                    reply_markup=origin_link(f.url),
-                                    thumbnail=mediathumb,
-                                    title=f.mediatitle,
-                                    write_timeout=60,
-                                    filename=f.mediafilename[0],
-                                )
-                            elif len(f.mediaurls) == 1:
-                                if ".gif" in f.mediaurls[0]:
-                                    result = await message.reply_animation(
-                                        media[0],
-                                        caption=f.caption,
-                                        reply_markup=origin_link(f.url),
-                                        write_timeout=60,
-                                        filename=f.mediafilename[0],
-                                    )
-                                else:
-                                    result = await message.reply_photo(
-                                        media[0],
-                                        caption=f.caption,
-                                        reply_markup=origin_link(f.url),
-                                        write_timeout=60,
-                                        filename=f.mediafilename[0],
-                                    )
-                            else:
-                                result = await message.reply_media_group(
-                                    [
-                                        (
-                                            InputMediaVideo(
-                                                img,
-                                                caption=f.caption,
-                                                filename=filename,
-                                                supports_streaming=True,
-                                            )
-                                            if ".gif" in mediaurl
-                                            else InputMediaPhoto(
-                                                img,
-                                                caption=f.caption,
-                                                filename=filename,
-                                            )
-                                        )
-                                        for img, mediaurl, filename in zip(
-                                            media, f.mediaurls, f.mediafilename
-                                        )
-                                    ],
-                                    write_timeout=60,
-                                )
-                                await message.reply_text(
-                                    f.caption, reply_markup=origin_link(f.url)
-                                )
+                            medias = [mediathumb, *media]
+                            result = await MEDIA_REPLIES.get(
+                                f.mediatype, reply_image
+                            )(message, f, media, mediathumb, caption, reply_markup)
                             # store file caches
                             if isinstance(result, tuple):  # media group
-                                for filename, item in zip(f.mediafilename, result):
-                                    if isinstance(
-                                        item.effective_attachment, tuple
-                                    ):  # PhotoSize
-                                        await cache_media(
-                                            filename, item.effective_attachment[0]
-                                        )
-                                    else:
-                                        await cache_media(
-                                            filename, item.effective_attachment
-                                        )
+                                await cache_media_group(f.mediafilename, result)
                             else:
                                 if isinstance(
                                     result.effective_attachment, tuple
@@ -355,62 +665,85 @@ async def parse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                                     await cache_media(
                                         f.mediafilename[0], result.effective_attachment
                                     )
-                            medias = [mediathumb, *media]
-                    finally:
-                        for item in medias:
-                            if isinstance(item, Path):
-                                item.unlink(missing_ok=True)
-            except BadRequest as err:
-                if (
-                    "Not enough rights to send" in err.message
-                    or "Need administrator rights in the channel chat" in err.message
-                ):
-                    await message.chat.leave()
-                    logger.warning(
-                        f"{err} 第{i}次异常->权限不足, 无法发送给{'@'+message.chat.username if message.chat.username else message.chat.id}"
-                    )
-                    break
-                elif (
-                    "Topic_deleted" in err.message
-                    or "Topic_closed" in err.message
-                    or "Message thread not found" in err.message
-                ):
-                    logger.warning(
-                        f"{err} 第{i}次异常->主题/话题已删除、关闭或早于加入时间，无法发送给{'@'+message.chat.username if message.chat.username else message.chat.id}"
-                    )
-                    break
-                else:
-                    logger.error(f"{err} 第{i}次异常->下载后上传: {f.url}")
-                    f.mediaraws = True
-                continue
-            except RetryAfter as err:
-                await asyncio.sleep(err.retry_after)
-                logger.error(f"{err} 第{i}次异常->限流: {f.url}")
-                continue
-            except NetworkError as err:
-                logger.error(f"{err} 第{i}次异常->服务错误: {f.url}")
-            except httpx.HTTPError as err:
-                logger.error(f"{err} 第{i}次异常->请求异常: {f.url}")
-            except Exception as err:
-                logger.exception(err)
-            else:
-                try:
-                    # for link sharing privacy under group
+                        finally:
+                            for item in medias:
+                                if isinstance(item, Path):
+                                    item.unlink(missing_ok=True)
+                except BadRequest as err:
                     if (
-                        len(urls) == 1
-                        and not update.channel_post
-                        and not message.reply_to_message
-                        and message.text is not None
+                        "Not enough rights to send" in err.message
+                        or "Need administrator rights in the channel chat" in err.message
+                    ):
+                        await message.chat.leave()
+                        logger.warning(
+                            f"{err} 第{i}次异常->权限不足, 无法发送给{'@'+message.chat.username if message.chat.username else message.chat.id}"
+                        )
+                        break
+                    elif (
+                        "Topic_deleted" in err.message
+                        or "Topic_closed" in err.message
+                        or "Message thread not found" in err.message
                     ):
-                        # try to delete only if bot have delete permission and this message is only for sharing
-                        match = re.match(BILIBILI_SHARE_URL_REGEX, message.text)
-                        if urls[0] == message.text or (
-                            match and match.group(0) == message.text
+                        logger.warning(
+                            f"{err} 第{i}次异常->主题/话题已删除、关闭或早于加入时间，无法发送给{'@'+message.chat.username if message.chat.username else message.chat.id}"
+                        )
+                        break
+                    else:
+                        failed = MEDIA_GROUP_ERROR_REGEX.search(err.message)
+                        if (
+                            failed
+                            and not failed_media
+                            and not (f.mediaraws or mediaraws)
+                            and 0 < int(failed.group(1)) <= len(f.mediaurls)
                         ):
-                            await message.delete()
-                finally:
-                    break
-            f = (await biliparser(f.url))[0]  # 重试获取该条链接信息
+                            failed_media.append(int(failed.group(1)) - 1)
+                            logger.error(
+                                f"{err} 第{i}次异常->下载第{failed.group(1)}项后上传: {f.url}"
+                            )
+                        else:
+                            logger.error(f"{err} 第{i}次异常->下载后上传: {f.url}")
+                            mediaraws = True
+                    continue
+                except RetryAfter as err:
+                    await asyncio.sleep(err.retry_after)
+                    logger.error(f"{err} 第{i}次异常->限流: {f.url}")
+                    continue
+                except NetworkError as err:
+                    logger.error(f"{err} 第{i}次异常->服务错误: {f.url}")
+                    # expired cdn links are rejected with 403/412, only then fetch fresh ones
+                    reparse = MEDIA_EXPIRED_ERROR_REGEX.search(err.message) is not None
+                    if i < 4:
+                        await asyncio.sleep(2 ** (i - 1))
+                except httpx.HTTPError as err:
+                    logger.error(f"{err} 第{i}次异常->请求异常: {f.url}")
+                    if i < 4:
+                        await asyncio.sleep(2 ** (i - 1))
+                except Exception as err:
+                    logger.exception(err)
+                else:
+                    try:
+                        # for link sharing privacy under group
+                        if (
+                            len(urls) == 1
+                            and not update.channel_post
+                            and not message.reply_to_message
+                            and message.text is not None
+                        ):
+                            # try to delete only if bot have delete permission and this message is only for sharing
+                            match = BILIBILI_SHARE_URL_REGEX.match(message.text)
+                            if urls[0] == message.text or (
+                                match and match.group(0) == message.text
+                            ):
+                                await message.delete()
+                    finally:
+                        break
+                if reparse and i < 4:
+                    f = (await biliparser(f.url, refresh=True))[0]  # 重试获取该条链接信息
+    finally:
+        # prefetches left behind by a failed or aborted feed
+        for task in prefetched.values():
+            task.cancel()
+            task.add_done_callback(discard_feed_media)
 
 
 async def fetch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -426,12 +759,10 @@ async def fetch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if f.mediaurls:
             medias = []
             try:
-                async with httpx.AsyncClient(
-                    http2=True, timeout=90, follow_redirects=True
-                ) as client:
-                    tasks = [
+                medias = await get_medias(
+                    *(
                         get_media(
-                            client,
+                            MEDIA_CLIENT,
                             f.url,
                             media,
                             filename,
@@ -439,40 +770,42 @@ async def fetch(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
                             media_check_ignore=True,
                         )
                         for media, filename in zip(f.mediaurls, f.mediafilename)
-                    ]
-                    medias = await asyncio.gather(*tasks)
-                    logger.info(f"上传中: {f.url}")
-                    if len(medias) > 1:
-                        result = await message.reply_media_group(
-                            [
-                                InputMediaDocument(media, filename=filename)
-                                for media, filename in zip(medias, f.mediafilename)
-                            ],
-                            write_timeout=60,
-                        )
+                    )
+                )
+                logger.info(f"上传中: {f.url}")
+                if len(medias) > 1:
+                    result = await message.reply_media_group(
+                        [
+                            InputMediaDocument(
+                                media,
+                                caption=f.caption if not num else None,
+                                filename=filename,
+                            )
+                            for num, (media, filename) in enumerate(
+                                zip(medias, f.mediafilename)
+                            )
+                        ],
+                        write_timeout=60,
+                    )
+                    await cache_media_group(f.mediafilename, result)
+                    # albums cannot carry buttons, follow up with the origin link only
+                    try:
                         await message.reply_text(
-                            f.caption, reply_markup=origin_link(f.url)
-                        )
-                        for filename, item in zip(f.mediafilename, result):
-                            if isinstance(
-                                item.effective_attachment, tuple
-                            ):  # PhotoSize
-                                await cache_media(
-                                    filename, item.effective_attachment[0]
-                                )
-                            else:
-                                await cache_media(filename, item.effective_attachment)
-                    else:
-                        result = await message.reply_document(
-                            document=medias[0],
-                            caption=f.caption,
-                            reply_markup=origin_link(f.url),
-                            write_timeout=60,
-                            filename=f.mediafilename[0],
-                        )
-                        await cache_media(
-                            f.mediafilename[0], result.effective_attachment
+                            escape_markdown(f.url), reply_markup=origin_link(f.url)
                         )
+                    except TelegramError as err:
+                        logger.error(f"{err} -> 原链接发送失败: {f.url}")
+                else:
+                    result = await message.reply_document(
+                        document=medias[0],
+                        caption=f.caption,
+                        reply_markup=origin_link(f.url),
+                        write_timeout=60,
+                        filename=f.mediafilename[0],
+                    )
+                    await cache_media(
+                        f.mediafilename[0], result.effective_attachment
+                    )
             finally:
                 for item in medias:
                     if isinstance(item, Path):
@@ -488,7 +821,7 @@ async def inlineparse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
                 "Query is too old and response timeout expired or query id is invalid"
                 in err.message
             ):
-                logger.error(f"{err} -> Inline请求超时: {f.url}")
+                logger.error(f"{err} -> Inline请求超时: {inline_query.query}")
             else:
                 logger.exception(err)
                 raise err
@@ -500,22 +833,11 @@ async def inlineparse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
     if inline_query is None:
         return
     query = inline_query.query
-    helpmsg = [
-        InlineQueryResultArticle(
-            id=uuid4().hex,
-            title="帮助",
-            description="将 Bot 添加到群组或频道可以自动匹配消息, 请注意 Inline 模式存在限制: 只可发单张图，消耗设备流量。",
-            reply_markup=SOURCE_CODE_MARKUP,
-            input_message_content=InputTextMessageContent(
-                await get_description(context)
-            ),
-        )
-    ]
-    if not query:
-        return await inline_query_answer(inline_query, helpmsg)
-    url_re = re.search(BILIBILI_URL_REGEX, query)
+    url_re = BILIBILI_URL_REGEX.search(query) if query else None
     if url_re is None:
-        return await inline_query_answer(inline_query, helpmsg)
+        return await inline_query_answer(
+            inline_query, inline_help(get_description(context))
+        )
     url = url_re.group(0)
     logger.info(f"Inline: {url}")
     [f] = await biliparser(url)
@@ -523,7 +845,7 @@ async def inlineparse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         logger.warning(f"解析错误! {f}")
         results = [
             InlineQueryResultArticle(
-                id=uuid4().hex,
+                id="error",
                 title="解析错误!",
                 description=escape_markdown(f.__str__()),
                 input_message_content=InputTextMessageContent(str(f)),
@@ -531,124 +853,125 @@ async def inlineparse(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
         ]
         return await inline_query_answer(inline_query, results)
 
+    caption = f.caption
+    reply_markup = origin_link(f.url)
+    summary = f"{f.user}: {f.content}"
     if not f.mediaurls:
         results = [
             InlineQueryResultArticle(
-                id=uuid4().hex,
+                id="0",
                 title=f.user,
                 description=f.content,
-                reply_markup=origin_link(f.url),
-                input_message_content=InputTextMessageContent(f.caption),
+                reply_markup=reply_markup,
+                input_message_content=InputTextMessageContent(caption),
             )
         ]
     else:
         if f.mediatype == "video":
             cache_file_id = await get_cache_media(f.mediafilename[0])
+            width, height = f.mediasize
             results = [
                 InlineQueryResultCachedVideo(
-                    id=uuid4().hex,
+                    id="0",
                     video_file_id=cache_file_id,
-                    caption=f.caption,
+                    caption=caption,
                     title=f.mediatitle,
-                    description=f"{f.user}: {f.content}",
-                    reply_markup=origin_link(f.url),
+                    description=summary,
+                    reply_markup=reply_markup,
                 )
                 if cache_file_id
                 else InlineQueryResultVideo(
-                    id=uuid4().hex,
-                    caption=f.caption,
+                    id="0",
+                    caption=caption,
                     title=f.mediatitle,
-                    description=f"{f.user}: {f.content}",
+                    description=summary,
                     mime_type="video/mp4",
-                    reply_markup=origin_link(f.url),
+                    reply_markup=reply_markup,
                     thumbnail_url=f.mediathumb,
                     video_url=referer_url(f.mediaurls[0], f.url),
                     video_duration=f.mediaduration,
-                    video_width=(
-                        f.mediadimention["height"]
-                        if f.mediadimention["rotate"]
-                        else f.mediadimention["width"]
-                    ),
-                    video_height=(
-                        f.mediadimention["width"]
-                        if f.mediadimention["rotate"]
-                        else f.mediadimention["height"]
-                    ),
+                    video_width=width,
+                    video_height=height,
                 )
             ]
         elif f.mediatype == "audio":
             cache_file_id = await get_cache_media(f.mediafilename[0])
             results = [
                 InlineQueryResultCachedAudio(
-                    id=uuid4().hex,
+                    id="0",
                     audio_file_id=cache_file_id,
-                    caption=f.caption,
-                    reply_markup=origin_link(f.url),
+                    caption=caption,
+                    reply_markup=reply_markup,
                 )
                 if cache_file_id
                 else InlineQueryResultAudio(
-                    id=uuid4().hex,
-                    caption=f.caption,
+                    id="0",
+                    caption=caption,
                     title=f.mediatitle,
                     audio_duration=f.mediaduration,
                     audio_url=referer_url(f.mediaurls[0], f.url),
                     performer=f.user,
-                    reply_markup=origin_link(f.url),
+                    reply_markup=reply_markup,
                 ),
             ]
         else:
-            cache_file_ids = await asyncio.gather(
-                *[get_cache_media(filename) for filename in f.mediafilename]
-            )
+            cache_map = await get_cache_media_many(f.mediafilename)
+            cache_file_ids = [cache_map.get(filename) for filename in f.mediafilename]
+            gif_flags = [is_gif(mediaurl) for mediaurl in f.mediaurls]
             results = [
                 (
                     (
                         InlineQueryResultCachedGif(
-                            id=uuid4().hex,
+                            id=str(num),
                             gif_file_id=cache_file_id,
-                            caption=f.caption,
-                            title=f"{f.user}: {f.content}",
-                            reply_markup=origin_link(f.url),
+                            caption=caption,
+                            title=summary,
+                            reply_markup=reply_markup,
                         )
-                        if ".gif" in mediaurl
+                        if gif
                         else InlineQueryResultCachedPhoto(
-                            id=uuid4().hex,
+                            id=str(num),
                             photo_file_id=cache_file_id,
-                            caption=f.caption,
+                            caption=caption,
                             title=f.user,
                             description=f.content,
-                            reply_markup=origin_link(f.url),
+                            reply_markup=reply_markup,
                         )
                     )
                     if cache_file_id
                     else (
                         InlineQueryResultGif(
-                            id=uuid4().hex,
-                            caption=f.caption,
-                            title=f"{f.user}: {f.content}",
+                            id=str(num),
+                            caption=caption,
+                            title=summary,
                             gif_url=mediaurl,
-                            reply_markup=origin_link(f.url),
+                            reply_markup=reply_markup,
                             thumbnail_url=mediaurl,
                         )
-                        if ".gif" in mediaurl
+                        if gif
                         else InlineQueryResultPhoto(
-                            id=uuid4().hex,
-                            caption=f.caption,
+                            id=str(num),
+                            caption=caption,
                             title=f.user,
                             description=f.content,
-                            photo_url=mediaurl + "@1280w.jpg",
-                            reply_markup=origin_link(f.url),
-                            thumbnail_url=mediaurl + "@512w_512h.jpg",
+                            photo_url=f"{mediaurl}@1280w.jpg",
+                            reply_markup=reply_markup,
+                            thumbnail_url=f"{mediaurl}@512w_512h.jpg",
                         )
                     )
                 )
-                for mediaurl, cache_file_id in zip(f.mediaurls, cache_file_ids)
+                for num, (mediaurl, gif, cache_file_id) in enumerate(
+                    zip(f.mediaurls, gif_flags, cache_file_ids)
+                )
             ]
     return await inline_query_answer(inline_query, results)
 
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
-    logger.exception(context.error)
+    # not called from an except block, attach the handler's exception explicitly
+    logger.opt(exception=context.error).error(
+        "Update {} caused error {}", update, context.error
+    )
 
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -656,11 +979,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     if message is None:
         return
     await message.reply_text(
-        await get_description(context), reply_markup=SOURCE_CODE_MARKUP
+        get_description(context), reply_markup=SOURCE_CODE_MARKUP
     )
 
 
 async def post_init(application: Application):
+    global MEDIA_CLIENT, MEDIA_SEMAPHORE
+    MEDIA_CLIENT = httpx.AsyncClient(
+        headers=headers, limits=limits, http2=True, timeout=90, follow_redirects=True
+    )
+    MEDIA_SEMAPHORE = asyncio.Semaphore(MEDIA_SEMAPHORE_SIZE)
+    client_init()
+    LOCAL_TEMP_FILE_PATH.mkdir(parents=True, exist_ok=True)
     await db_init()
     await application.bot.set_my_commands(
         [
@@ -669,23 +999,31 @@ async def post_init(application: Application):
             ["parse", "获取匹配内容"],
         ]
     )
-    bot_me = await application.bot.get_me()
-    logger.info(f"Bot @{bot_me.username} started.")
+    logger.info(f"Bot @{application.bot.username} started.")
 
 
 async def post_shutdown(application: Application):
+    await MEDIA_CLIENT.aclose()
+    await client_close()
     await db_close()
 
 
 def add_handler(application: Application):
     application.add_handler(CommandHandler("start", start, block=False))
-    application.add_handler(CommandHandler("file", fetch, block=False))
+    application.add_handler(
+        CommandHandler(
+            "file", fetch, filters=filters.UpdateType.MESSAGE, block=False
+        )
+    )
     application.add_handler(
         MessageHandler(
-            filters.Entity(MessageEntity.URL)
-            | filters.Entity(MessageEntity.TEXT_LINK)
-            | filters.Regex(BILIBILI_URL_REGEX)
-            | filters.CaptionRegex(BILIBILI_URL_REGEX),
+            ~filters.UpdateType.EDITED
+            & (
+                filters.Entity(MessageEntity.URL)
+                | filters.Entity(MessageEntity.TEXT_LINK)
+                | filters.Regex(BILIBILI_URL_REGEX)
+                | filters.CaptionRegex(BILIBILI_URL_REGEX)
+            ),
             parse,
             block=False,
         )
@@ -702,6 +1040,7 @@ def main():
     else:
         logger.error("Need TOKEN.")
         sys.exit(1)
+    concurrent_updates = int(os.environ.get("SEMAPHORE_SIZE", 256))
     application = (
         Application.builder()
         .defaults(
@@ -723,11 +1062,8 @@ def main():
             os.environ.get("API_BASE_FILE_URL", "https://api.telegram.org/file/bot")
         )
         .local_mode(bool(LOCAL_MODE))
-        .concurrent_updates(
-            int(os.environ.get("SEMAPHORE_SIZE", 256))
-            if os.environ.get("SEMAPHORE_SIZE")
-            else True
-        )
+        .concurrent_updates(concurrent_updates)
+        .connection_pool_size(concurrent_updates)
         .build()
     )
     add_handler(application)
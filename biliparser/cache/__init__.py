@@ -1,6 +1,6 @@
 import os
 
-import json
+import orjson
 import redis
 
 CACHES_TIMER = {
@@ -18,20 +18,20 @@ CACHES_TIMER = {
 class FakeRedis:
     def __init__(self):
         try:
-            with open("cache.json", "r", encoding='utf-8') as f:
-                self.cache = json.load(f)
-        except IOError:
+            with open("cache.json", "rb") as f:
+                self.cache = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
             self.cache = {}
 
     def get(self, key: str):
         return self.cache[key].encode("utf-8") if key in self.cache else None
 
     def set(self, key: str, value: str | bytes, *args, **kwargs) -> None:
-        with open("cache.json", "w", encoding="utf-8") as f:
-            json.dump(self.cache, f, ensure_ascii=False)
         if isinstance(value, bytes):
             value = value.decode("utf-8")
         self.cache[key] = value
+        with open("cache.json", "wb") as f:
+            f.write(orjson.dumps(self.cache))
 
 
 class RedisCache:
@@ -27,6 +27,14 @@ async def db_init() -> None:
         use_tz=True,
     )
     await Tortoise.generate_schemas()
+    if db_url.startswith("sqlite"):
+        # tortoise already enables WAL, relax fsync and keep hot pages in memory
+        await Tortoise.get_connection("default").execute_script(
+            "PRAGMA synchronous=NORMAL;"
+            "PRAGMA cache_size=-16384;"
+            "PRAGMA mmap_size=268435456;"
+            "PRAGMA temp_store=MEMORY;"
+        )
 
 
 async def db_close() -> None:
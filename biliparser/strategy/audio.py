@@ -8,6 +8,8 @@ from ..cache import CACHES_TIMER, RedisCache
 from ..utils import BILI_API, LOCAL_MODE, ParserException, escape_markdown, logger
 from .feed import Feed
 
+AUDIO_ID_REGEX = re.compile(r"bilibili\.com\/audio\/au(\d+)")
+
 
 class Audio(Feed):
     infocontent: dict = {}
@@ -20,7 +22,7 @@ class Audio(Feed):
 
     async def handle(self):
         logger.info(f"处理音频信息: 链接: {self.rawurl}")
-        match = re.search(r"bilibili\.com\/audio\/au(\d+)", self.rawurl)
+        match = AUDIO_ID_REGEX.search(self.rawurl)
         if not match:
             raise ParserException("音频链接错误", self.rawurl)
         self.audio_id = int(match.group(1))
@@ -40,7 +42,7 @@ class Audio(Feed):
                     BILI_API + "/audio/music-service-c/songs/playing",
                     params={"song_id": self.audio_id},
                 )
-                self.infocontent = r.json()
+                self.infocontent = orjson.loads(r.content)
             except Exception as e:
                 raise ParserException(f"音频获取错误:{self.audio_id}", self.rawurl, e)
             # 3.解析音频
@@ -86,7 +88,7 @@ class Audio(Feed):
                         "platform": "",
                     },
                 )
-                self.mediacontent = r.json()
+                self.mediacontent = orjson.loads(r.content)
             except Exception as e:
                 raise ParserException(f"音频媒体获取错误:{self.audio_id}", self.rawurl, e)
             # 3.解析音频
@@ -1,6 +1,6 @@
 import re
 from abc import ABC, abstractmethod
-from functools import cached_property
+from functools import cached_property, lru_cache
 
 import httpx
 import orjson
@@ -9,6 +9,8 @@ from telegram.constants import MessageLimit
 from ..cache import CACHES_TIMER, RedisCache
 from ..utils import BILI_API, escape_markdown, get_filename, logger
 
+CN_TAG_REGEX = re.compile(r"\\#((?:(?!\\#).)+)\\#")
+
 
 class Feed(ABC):
     user: str = ""
@@ -51,11 +53,18 @@ class Feed(ABC):
         )
 
     @staticmethod
+    @lru_cache(maxsize=2048)
     def clean_cn_tag_style(content: str) -> str:
         if not content:
             return ""
         ## Refine cn tag style display: #abc# -> #abc
-        return re.sub(r"\\#((?:(?!\\#).)+)\\#", r"\\#\1 ", content)
+        return CN_TAG_REGEX.sub(r"\\#\1 ", content)
+
+    @property
+    def mediasize(self) -> tuple[int, int]:
+        width = self.mediadimention["width"]
+        height = self.mediadimention["height"]
+        return (height, width) if self.mediadimention["rotate"] else (width, height)
 
     @cached_property
     def user_markdown(self):
@@ -63,11 +72,11 @@ class Feed(ABC):
 
     @property
     def content(self):
-        return self.shrink_line(self.__content)
+        return self.__content
 
     @content.setter
     def content(self, content):
-        self.__content = content
+        self.__content = self.shrink_line(content)
 
     @cached_property
     def content_markdown(self):
@@ -142,18 +151,21 @@ class Feed(ABC):
         )  # I don't need url twice with extra_markdown
         if self.user:
             caption += self.user_markdown + ":\n"
-        prev_caption = caption
+        body = str()
         if self.content_markdown:
-            caption += (self.clean_cn_tag_style(self.content_markdown)) + "\n"
-        if len(caption) > MessageLimit.CAPTION_LENGTH:
-            return prev_caption
-        prev_caption = caption
+            body += self.content_markdown + "\n"
         if self.comment_markdown:
-            caption += "〰〰〰〰〰〰〰〰〰〰\n" + (
-                self.clean_cn_tag_style(self.comment_markdown)
+            body += "〰〰〰〰〰〰〰〰〰〰\n" + self.comment_markdown
+        # tags never span lines, so cleaning the joined body once equals cleaning each part
+        full_caption = caption + self.clean_cn_tag_style(body)
+        if len(full_caption) <= MessageLimit.CAPTION_LENGTH:
+            return full_caption
+        if self.content_markdown:
+            content_caption = (
+                caption + self.clean_cn_tag_style(self.content_markdown) + "\n"
             )
-        if len(caption) > MessageLimit.CAPTION_LENGTH:
-            return prev_caption
+            if len(content_caption) <= MessageLimit.CAPTION_LENGTH:
+                return content_caption
         return caption
 
     async def parse_reply(self, oid, reply_type, seek_comment_id = None):
@@ -179,7 +191,7 @@ class Feed(ABC):
                     params=params,
                     headers={"Referer": "https://www.bilibili.com/client"},
                 )
-                response = r.json()
+                response = orjson.loads(r.content)
             except Exception as e:
                 logger.exception(f"评论获取错误: {cache_key} {e}")
                 return {}
@@ -7,6 +7,8 @@ from ..cache import CACHES_TIMER, RedisCache
 from ..utils import ParserException, escape_markdown, logger
 from .feed import Feed
 
+ROOM_ID_REGEX = re.compile(r"live\.bilibili\.com[\/\w]*\/(\d+)")
+
 
 class Live(Feed):
     rawcontent: dict = {}
@@ -18,7 +20,7 @@ class Live(Feed):
 
     async def handle(self):
         logger.info(f"处理直播信息: 链接: {self.rawurl}")
-        match = re.search(r"live\.bilibili\.com[\/\w]*\/(\d+)", self.rawurl)
+        match = ROOM_ID_REGEX.search(self.rawurl)
         if not match:
             raise ParserException("直播链接错误", self.rawurl)
         self.room_id = int(match.group(1))
@@ -38,7 +40,7 @@ class Live(Feed):
                     "https://api.live.bilibili.com/xlive/web-room/v1/index/getInfoByRoom",
                     params={"room_id": self.room_id},
                 )
-                self.rawcontent = r.json()
+                self.rawcontent = orjson.loads(r.content)
             except Exception as e:
                 raise ParserException(f"直播获取错误:{self.room_id}", self.rawurl, e)
             # 3.解析直播
@@ -1,5 +1,5 @@
 import re
-from functools import cached_property, lru_cache, reduce
+from functools import cached_property
 
 import orjson
 
@@ -7,12 +7,36 @@ from ..cache import CACHES_TIMER, RedisCache
 from ..utils import BILI_API, ParserException, escape_markdown, logger
 from .feed import Feed
 
+DYNAMIC_ID_REGEX = re.compile(r"bilibili\.com[\/\w]*\/(\d+)")
+DATAPATH_MAP = {
+    "MDL_DYN_TYPE_ARCHIVE": "dyn_archive",
+    "MDL_DYN_TYPE_PGC": "dyn_pgc",
+    "MDL_DYN_TYPE_ARTICLE": "dyn_article",
+    "MDL_DYN_TYPE_MUSIC": "dyn_music",
+    "MDL_DYN_TYPE_COMMON": "dyn_common",
+    "MDL_DYN_TYPE_LIVE": "dyn_live",
+    "MDL_DYN_TYPE_UGC_SEASON": "dyn_ugc_season",
+    "MDL_DYN_TYPE_DRAW": "dyn_draw",
+    "MDL_DYN_TYPE_OPUS": "dyn_opus",
+    "MDL_DYN_TYPE_FORWARD": "dyn_forward",
+}
+# dynamic rtype -> comment reply type
+REPLY_TYPE_MAP = {
+    2: 11,
+    16: 5,
+    64: 12,
+    256: 14,
+    **dict.fromkeys([8, 512, *range(4000, 4200)], 1),
+    **dict.fromkeys([1, 4, *range(4200, 4300), *range(2048, 2100)], 17),
+}
+
 
 class Opus(Feed):
     detailcontent: dict = {}
     dynamic_id: int = 0
     user: str = ""
     __content: str = ""
+    __content_shrinked: str | None = None
     forward_user: str = ""
     forward_uid: int = 0
     forward_content: str = ""
@@ -20,18 +44,7 @@ class Opus(Feed):
 
     @cached_property
     def reply_type(self):
-        if self.rtype == 2:
-            return 11
-        if self.rtype == 16:
-            return 5
-        if self.rtype == 64:
-            return 12
-        if self.rtype == 256:
-            return 14
-        if self.rtype in [8, 512, *range(4000, 4200)]:
-            return 1
-        if self.rtype in [1, 4, *range(4200, 4300), *range(2048, 2100)]:
-            return 17
+        return REPLY_TYPE_MAP.get(self.rtype)
 
     @cached_property
     def rtype(self):
@@ -42,18 +55,20 @@ class Opus(Feed):
         return int(self.detailcontent["item"]["basic"]["rid_str"])
 
     @property
-    @lru_cache(maxsize=1)
     def content(self):
-        content = self.__content
-        if self.has_forward:
-            if self.forward_user:
-                content += f"//@{self.forward_user}:\n"
-            content += self.forward_content
-        return self.shrink_line(content)
+        if self.__content_shrinked is None:
+            content = self.__content
+            if self.has_forward:
+                if self.forward_user:
+                    content += f"//@{self.forward_user}:\n"
+                content += self.forward_content
+            self.__content_shrinked = self.shrink_line(content)
+        return self.__content_shrinked
 
     @content.setter
     def content(self, content):
         self.__content = content
+        self.__content_shrinked = None
 
     @cached_property
     def content_markdown(self):
@@ -73,24 +88,15 @@ class Opus(Feed):
         return f"https://t.bilibili.com/{self.dynamic_id}"
 
     def __list_dicts_to_dict(self, lists: list[dict]):
-        return reduce(lambda old, new: old.update(new) or old, lists, {})
+        result = {}
+        for item in lists:
+            result.update(item)
+        return result
 
     def __opus_handle_major(self, major):
-        datapath_map = {
-            "MDL_DYN_TYPE_ARCHIVE": "dyn_archive",
-            "MDL_DYN_TYPE_PGC": "dyn_pgc",
-            "MDL_DYN_TYPE_ARTICLE": "dyn_article",
-            "MDL_DYN_TYPE_MUSIC": "dyn_music",
-            "MDL_DYN_TYPE_COMMON": "dyn_common",
-            "MDL_DYN_TYPE_LIVE": "dyn_live",
-            "MDL_DYN_TYPE_UGC_SEASON": "dyn_ugc_season",
-            "MDL_DYN_TYPE_DRAW": "dyn_draw",
-            "MDL_DYN_TYPE_OPUS": "dyn_opus",
-            "MDL_DYN_TYPE_FORWARD": "dyn_forward",
-        }
         if not major:
             return
-        target = datapath_map.get(major["type"])
+        target = DATAPATH_MAP.get(major["type"])
         if major["type"] == "MDL_DYN_TYPE_FORWARD":
             self.has_forward = True
             majorcontent = self.__list_dicts_to_dict(major[target]["item"]["modules"])
@@ -105,7 +111,7 @@ class Opus(Feed):
         elif major["type"] == "MDL_DYN_TYPE_DRAW":
             self.mediaurls = [item["src"] for item in major[target]["items"]]
             self.mediatype = "image"
-        elif datapath_map.get(major["type"]):
+        elif target:
             if major[target].get("cover"):
                 self.mediaurls = major[target]["cover"]
                 self.mediatype = "image"
@@ -119,7 +125,7 @@ class Opus(Feed):
 
     async def handle(self):
         logger.info(f"处理动态信息: 链接: {self.rawurl}")
-        match = re.search(r"bilibili\.com[\/\w]*\/(\d+)", self.rawurl)
+        match = DYNAMIC_ID_REGEX.search(self.rawurl)
         if not match:
             raise ParserException("动态链接错误", self.rawurl)
         self.dynamic_id = int(match.group(1))
@@ -139,7 +145,7 @@ class Opus(Feed):
                     BILI_API + "/x/polymer/web-dynamic/desktop/v1/detail",
                     params={"id": self.dynamic_id},
                 )
-                response = r.json()
+                response = orjson.loads(r.content)
             except Exception as e:
                 raise ParserException(f"动态获取错误:{self.dynamic_id}", self.rawurl, e)
             # 3.动态解析
@@ -5,14 +5,19 @@ from functools import cached_property
 from io import BytesIO
 
 import orjson
-from bs4 import BeautifulSoup
-from bs4.element import Tag
 from telegraph.aio import Telegraph
 
 from ..cache import CACHES_TIMER, RedisCache
 from ..utils import ParserException, compress, escape_markdown, logger, referer_url
 from .feed import Feed
 
+READ_ID_REGEX = re.compile(
+    r"bilibili\.com\/read\/(?:cv|mobile\/|mobile\?id=)(\d+)"
+)
+INITIAL_STATE_REGEX = re.compile(
+    r"window\.__INITIAL_STATE__=(.*?);\(function\(\)"
+)
+
 telegraph = Telegraph(access_token=os.environ.get("TELEGRAPH_ACCESS_TOKEN", None))
 
 
@@ -52,9 +57,7 @@ class Read(Feed):
 
     async def handle(self):
         logger.info(f"处理文章信息: 链接: {self.rawurl}")
-        match = re.search(
-            r"bilibili\.com\/read\/(?:cv|mobile\/|mobile\?id=)(\d+)", self.rawurl
-        )
+        match = READ_ID_REGEX.search(self.rawurl)
         if not match:
             raise ParserException("文章链接错误", self.rawurl)
         self.read_id = int(match.group(1))
@@ -75,25 +78,23 @@ class Read(Feed):
             except Exception as e:
                 raise ParserException(f"文章页面获取错误:{self.read_id}", self.rawurl, e)
                 # 3.解析文章
-            cv_init = re.search(r"window\.__INITIAL_STATE__=(.*?);\(function\(\)", r.text)
+            cv_init = INITIAL_STATE_REGEX.search(r.text)
             if not cv_init:
                 raise ParserException(
                     f"文章页面内容获取错误:{self.read_id}", self.rawurl, cv_init
                 )
             cv_content = orjson.loads(cv_init.group(1))
-        self.uid = cv_content.get("readInfo").get("author").get("mid")
-        self.user = cv_content.get("readInfo").get("author").get("name")
-        self.content = cv_content.get("readInfo").get("summary")
-        mediaurls = (
-            cv_content.get("readInfo").get("banner_url")
-            if cv_content.get("readInfo").get("banner_url")
-            else cv_content.get("readInfo").get("image_urls")
-        )
+        read_info = cv_content.get("readInfo")
+        author = read_info.get("author")
+        self.uid = author.get("mid")
+        self.user = author.get("name")
+        self.content = read_info.get("summary")
+        mediaurls = read_info.get("banner_url") or read_info.get("image_urls")
         if mediaurls:
             logger.info(f"文章mediaurls: {mediaurls}")
             self.mediaurls = mediaurls
             self.mediatype = "image"
-        title = cv_content.get("readInfo").get("title")
+        title = read_info.get("title")
         if not cache_base:
             # 4.缓存文章
             try:
@@ -118,7 +119,7 @@ class Read(Feed):
             graphurl = cache_graphurl
         else:
             # 3.解析文章转为链接
-            article_content = cv_content.get("readInfo").get("content")
+            article_content = read_info.get("content")
             if not telegraph.get_access_token():
                 logger.info("creating_account")
                 result = await telegraph.create_account(
@@ -138,6 +139,9 @@ class Read(Feed):
                     )
                 ).get("url")
             except orjson.JSONDecodeError:
+                from bs4 import BeautifulSoup
+                from bs4.element import Tag
+
                 article = BeautifulSoup(article_content, "lxml")
                 if not isinstance(article, Tag):
                     raise ParserException("文章内容解析错误", self.rawurl, cv_content)
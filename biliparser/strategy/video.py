@@ -12,7 +12,6 @@ from ..utils import (
     LOCAL_MODE,
     ParserException,
     escape_markdown,
-    headers,
     logger,
 )
 from .feed import Feed
@@ -20,6 +19,12 @@ from .feed import Feed
 from urllib.parse import urlparse, parse_qs
 
 QN = [64, 32, 16]
+VIDEO_LINK_REGEX = re.compile(
+    r"(?:bilibili\.com/(?:video|bangumi/play)|b23\.tv|acg\.tv)/(?:(?P<bvid>BV\w{10})|av(?P<aid>\d+)|ep(?P<epid>\d+)|ss(?P<ssid>\d+)|)/?\??(?:p=(?P<page>\d+))?"
+)
+FESTIVAL_LINK_REGEX = re.compile(
+    r"bilibili\.com/festival/(?P<festivalid>\w+)\?(?:bvid=(?P<bvid>BV\w{10}))"
+)
 
 
 class Video(Feed):
@@ -74,9 +79,9 @@ class Video(Feed):
         return f"https://www.bilibili.com/video/av{self.aid}?p={self.page}"
 
     async def __test_url_status_code(self, url, referer):
-        header = headers.copy()
-        header["Referer"] = referer
-        async with self.client.stream("GET", url, headers=header) as response:
+        async with self.client.stream(
+            "GET", url, headers={"Referer": referer}
+        ) as response:
             if response.status_code != 200:
                 return False
             return True
@@ -89,13 +94,13 @@ class Video(Feed):
             BILI_API + "/x/player/playurl",
             params=params,
         )
-        video_result = r.json()
-        logger.debug(f"视频内容: {video_result}")
+        video_result = orjson.loads(r.content)
+        logger.debug("视频内容: {}", video_result)
+        data = video_result.get("data") if video_result.get("code") == 0 else None
+        durls = data.get("durl") if data else None
         if (
-            video_result.get("code") == 0
-            and video_result.get("data")
-            and video_result.get("data").get("durl")
-            and video_result.get("data").get("durl")[0].get("size")
+            durls
+            and durls[0].get("size")
             < (
                 int(
                     os.environ.get(
@@ -106,23 +111,22 @@ class Video(Feed):
                 else FileSizeLimit.FILESIZE_UPLOAD
             )
         ):
-            url = video_result["data"]["durl"][0]["url"]
+            durl = durls[0]
+            url = durl["url"]
             result = await self.__test_url_status_code(url, self.url)
-            if not result and video_result["data"]["durl"][0].get("backup_url", None):
-                url = video_result["data"]["durl"][0]["backup_url"]
+            if not result and durl.get("backup_url", None):
+                url = durl["backup_url"]
                 result = await self.__test_url_status_code(url, self.url)
             if result:
                 self.mediacontent = video_result
                 self.mediathumb = detail.get("pic")
-                self.mediaduration = round(
-                    video_result["data"]["durl"][0]["length"] / 1000
-                )
+                self.mediaduration = round(durl["length"] / 1000)
                 self.mediadimention = detail.get("pages")[0].get("dimension")
                 self.mediaurls = url
                 self.mediatype = "video"
                 self.mediaraws = (
                     False
-                    if video_result.get("data").get("durl")[0].get("size")
+                    if durl.get("size")
                     < (
                         FileSizeLimit.FILESIZE_DOWNLOAD_LOCAL_MODE
                         if LOCAL_MODE
@@ -134,14 +138,13 @@ class Video(Feed):
 
     async def handle(self):
         logger.info(f"处理视频信息: 链接: {self.rawurl}")
-        match = re.search(
-            r"(?:bilibili\.com/(?:video|bangumi/play)|b23\.tv|acg\.tv)/(?:(?P<bvid>BV\w{10})|av(?P<aid>\d+)|ep(?P<epid>\d+)|ss(?P<ssid>\d+)|)/?\??(?:p=(?P<page>\d+))?",
-            self.rawurl,
-        )
-        match_fes = re.search(
-            r"bilibili\.com/festival/(?P<festivalid>\w+)\?(?:bvid=(?P<bvid>BV\w{10}))",
-            self.rawurl,
+        match_fes = (
+            FESTIVAL_LINK_REGEX.search(self.rawurl)
+            if "/festival/" in self.rawurl
+            else None
         )
+        # festival links take precedence, only scan for a plain video id otherwise
+        match = VIDEO_LINK_REGEX.search(self.rawurl) if match_fes is None else None
         pr = urlparse(self.rawurl)
         qs = parse_qs(pr.query)
         seek_id = None
@@ -205,7 +208,7 @@ class Video(Feed):
                         BILI_API + "/pgc/view/web/season",
                         params=params,
                     )
-                    self.epcontent = r.json()
+                    self.epcontent = orjson.loads(r.content)
                 except Exception as e:
                     raise ParserException(
                         f"番剧获取错误:{epid if epid else ssid}", self.rawurl, e
@@ -257,7 +260,7 @@ class Video(Feed):
                     BILI_API + "/x/web-interface/view",
                     params=params,
                 )
-                self.infocontent = r.json()
+                self.infocontent = orjson.loads(r.content)
             except Exception as e:
                 raise ParserException(
                     f"视频获取错误:{aid if aid else bvid}", self.rawurl, e
@@ -286,15 +289,19 @@ class Video(Feed):
             except Exception as e:
                 logger.exception(f"缓存番剧错误: {e}")
         detail = self.infocontent["data"]
-        self.user = detail.get("owner").get("name")
-        self.uid = detail.get("owner").get("mid")
+        owner = detail.get("owner")
+        self.user = owner.get("name")
+        self.uid = owner.get("mid")
         self.content = detail.get("tname", "发布视频")
-        if detail.get("pages") and len(detail["pages"]) > 1:
-            self.content += f" - 第{page}P/共{len(detail['pages'])}P"
-        if detail.get("dynamic") or detail.get("desc"):
-            self.content += f" - {detail.get('dynamic') or detail.get('desc')}"
-        self.extra_markdown = f"[{escape_markdown(detail.get('title'))}]({self.url})"
-        self.mediatitle = detail.get("title")
+        pages = detail.get("pages")
+        if pages and len(pages) > 1:
+            self.content += f" - 第{page}P/共{len(pages)}P"
+        description = detail.get("dynamic") or detail.get("desc")
+        if description:
+            self.content += f" - {description}"
+        title = detail.get("title")
+        self.extra_markdown = f"[{escape_markdown(title)}]({self.url})"
+        self.mediatitle = title
         self.mediaurls = detail.get("pic")
         self.mediatype = "image"
         self.replycontent = await self.parse_reply(self.aid, self.reply_type, seek_id)
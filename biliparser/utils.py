@@ -6,23 +6,40 @@ import sys
 from io import BytesIO
 from urllib.parse import urlencode
 
+import httpx
 from loguru import logger
-from PIL import Image
 
 logger.remove()
-logger.add(sys.stdout, backtrace=True, diagnose=True)
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "DEBUG")
+logger.add(sys.stdout, level=LOG_LEVEL, backtrace=True, diagnose=True)
 if os.environ.get("LOG_TO_FILE"):
-    logger.add("bili_feed.log", backtrace=True, diagnose=True, rotation="1 MB")
+    logger.add(
+        "bili_feed.log",
+        level=LOG_LEVEL,
+        backtrace=True,
+        diagnose=True,
+        rotation="1 MB",
+    )
 
 
 headers = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) bilibili_pc/1.12.1 Chrome/106.0.5249.199 Electron/21.3.3 Safari/537.36"
 }
 
+# keep idle connections to the few bilibili hosts around between messages
+limits = httpx.Limits(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=60
+)
+
 BILI_API = os.environ.get("BILI_API", "https://api.bilibili.com")
 
 LOCAL_MODE = os.environ.get("LOCAL_MODE", False)
 
+MARKDOWN_ESCAPE_TABLE = str.maketrans(
+    {char: f"\\{char}" for char in "_*[]()~`>#+-=|{}.!\\"}
+)
+FILENAME_REGEX = re.compile(r"\/([^\/]*\.\w{3,4})(?:$|\?)")
+
 
 class ParserException(Exception):
     def __init__(self, msg, url, res=None):
@@ -49,7 +66,13 @@ def retry_catcher(func):
 
 
 def compress(inpil, size=1280, fix_ratio=False) -> BytesIO:
+    from PIL import Image  # only needed once media is actually downloaded
+
     pil = Image.open(inpil)
+    if size > 0 and not fix_ratio and max(pil.size) <= size:
+        # already fits, re-encoding would only cost time and usually bytes
+        inpil.seek(0)
+        return inpil
     if fix_ratio:
         w, h = pil.size
         if w / h > 20:
@@ -74,16 +97,20 @@ def compress(inpil, size=1280, fix_ratio=False) -> BytesIO:
 def escape_markdown(text: str):
     if not text:
         return ""
-    return re.sub(r"([_*\[\]()~`>\#\+\-=|{}\.!\\])", r"\\\1", html.unescape(text))
+    return html.unescape(text).translate(MARKDOWN_ESCAPE_TABLE)
 
 
 def get_filename(url) -> str:
-    target = re.search(r"\/([^\/]*\.\w{3,4})(?:$|\?)", url)
+    target = FILENAME_REGEX.search(url)
     if target:
         return target.group(1)
     return url
 
 
+def is_gif(url: str) -> bool:
+    return url.split("?", 1)[0].endswith(".gif")
+
+
 def referer_url(url: str, referer: str):
     if not referer:
         return url
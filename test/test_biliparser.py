@@ -1,13 +1,22 @@
 import pytest
+import pytest_asyncio
 
-from biliparser import biliparser
+from biliparser import biliparser, client_close
+from biliparser.__main__ import BILIBILI_SHARE_URL_REGEX, BILIBILI_URL_REGEX
 from biliparser.strategy.audio import Audio
 from biliparser.strategy.live import Live
-from biliparser.strategy.opus import Opus
+from biliparser.strategy.opus import REPLY_TYPE_MAP, Opus
 from biliparser.strategy.read import Read
 from biliparser.strategy.video import Video
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def api_client():
+    # every test runs in its own loop, drop the client bound to it
+    yield
+    await client_close()
+
+
 @pytest.mark.asyncio
 async def test_dynamic_parser():
     urls = [
@@ -66,3 +75,129 @@ async def test_video_parser():
         == "[【春晚鬼畜】赵本山：我就是念诗之王！【改革春风吹满地】](https://www.bilibili.com/video/av19390801?p=1)"
     )
     assert result[0].url == "https://www.bilibili.com/video/av19390801?p=1"
+
+
+@pytest.mark.asyncio
+async def test_cache_media_group_file_id_conflict(monkeypatch):
+    from datetime import datetime
+
+    from telegram import Chat, Document, Message
+
+    from biliparser.__main__ import cache_media_group
+    from biliparser.database import db_close, db_init, file_cache
+
+    monkeypatch.setenv("DATABASE_URL", "sqlite://:memory:")
+    await db_init()
+    try:
+        chat = Chat(1, Chat.PRIVATE)
+
+        def album(*file_ids):
+            return tuple(
+                Message(
+                    num,
+                    datetime.now(),
+                    chat,
+                    document=Document(file_id, f"unique{num}"),
+                )
+                for num, file_id in enumerate(file_ids)
+            )
+
+        await file_cache.create(mediafilename="a.jpg", file_id="stale")
+        await file_cache.create(mediafilename="old.jpg", file_id="dup")
+        await cache_media_group(["a.jpg", "b.jpg"], album("fresh", "dup"))
+        # the conflicting row must not take the rest of the album down with it
+        assert (await file_cache.get(mediafilename="a.jpg")).file_id == "fresh"
+        assert (await file_cache.get(mediafilename="old.jpg")).file_id == "dup"
+        assert await file_cache.get_or_none(mediafilename="b.jpg") is None
+        await cache_media_group(["c.jpg", "d.jpg"], album("c", "d"))
+        stored = file_cache.filter(mediafilename__in=["c.jpg", "d.jpg"])
+        assert await stored.count() == 2
+    finally:
+        await db_close()
+
+
+def test_fake_redis_persistence(tmp_path, monkeypatch):
+    from biliparser.cache import FakeRedis
+
+    monkeypatch.chdir(tmp_path)
+    cache = FakeRedis()
+    cache.set("a", b'{"x":1}')
+    cache.set("b", "2")
+    # the newest entry must make it to disk as well
+    reloaded = FakeRedis()
+    assert reloaded.get("a") == b'{"x":1}'
+    assert reloaded.get("b") == b"2"
+    content = (tmp_path / "cache.json").read_bytes()
+    (tmp_path / "cache.json").write_bytes(content[: len(content) // 2])
+    assert FakeRedis().get("a") is None
+
+
+def test_opus_reply_type_map():
+    cases = [
+        (2, 11),  # 相簿
+        (16, 5),  # 小视频
+        (64, 12),  # 专栏
+        (256, 14),  # 音频
+        (8, 1),  # 视频
+        (512, 1),
+        (4000, 1),
+        (4199, 1),
+        (1, 17),  # 转发
+        (4, 17),  # 文字
+        (4200, 17),
+        (4299, 17),
+        (2048, 17),
+        (2099, 17),
+        (0, None),
+        (3, None),
+        (2100, None),
+        (3999, None),
+        (4300, None),
+    ]
+    for rtype, reply_type in cases:
+        assert REPLY_TYPE_MAP.get(rtype) == reply_type, rtype
+
+
+def test_bilibili_url_regex():
+    cases = [
+        (
+            "https://www.bilibili.com/video/BV1bW411n7fY?p=2",
+            ["https://www.bilibili.com/video/BV1bW411n7fY?p=2"],
+        ),
+        (
+            "看看 https://b23.tv/xZCcov 和 https://t.bilibili.com/371426091702577219",
+            ["https://b23.tv/xZCcov", "https://t.bilibili.com/371426091702577219"],
+        ),
+        (
+            "https://live.bilibili.com/115\nhttps://b23.tv/BV1bW411n7fY",
+            ["https://live.bilibili.com/115", "https://b23.tv/BV1bW411n7fY"],
+        ),
+        ("http://m.BILIBILI.com/video/av123", ["http://m.BILIBILI.com/video/av123"]),
+        ("bilibilibb.com/x", ["bilibilibb.com/x"]),
+        ("b23bb.tv/abc", ["b23bb.tv/abc"]),
+        ("acg.tv/av1", ["acg.tv/av1"]),
+        ("bili2233.cn/abc", ["bili2233.cn/abc"]),
+        ("bili22.cn/x", ["bili22.cn/x"]),
+        ("BV1bW411n7fY", ["BV1bW411n7fY"]),
+        ("bv1bw411n7fy 结尾", ["bv1bw411n7fy"]),
+        ("BV123", []),
+        ("b23.tv", []),
+        ("https://example.com/bilibili", []),
+    ]
+    for text, urls in cases:
+        assert BILIBILI_URL_REGEX.findall(text) == urls, text
+    share_cases = [
+        ("【标题】 https://b23.tv/xZCcov", "【标题】 https://b23.tv/xZCcov"),
+        (
+            "【标题】 https://www.bilibili.com/video/BV1bW411n7fY?p=1 更多",
+            "【标题】 https://www.bilibili.com/video/BV1bW411n7fY?p=1",
+        ),
+        ("【】 https://bili2233.cn/abc", "【】 https://bili2233.cn/abc"),
+        ("【a】 http://b23.tv/x", None),
+        ("【标题】https://b23.tv/x", None),
+        ("【标题】 https://acg.tv/av1", None),
+        ("https://b23.tv/xZCcov", None),
+    ]
+    for text, share in share_cases:
+        match = BILIBILI_SHARE_URL_REGEX.match(text)
+        assert (match.group(0) if match else None) == share, text